@@ -52,7 +52,7 @@ def main(cfg: DictConfig):
     num_samples = int(5e4)
     target = setup_target(cfg, num_samples)
 
-    results = pd.DataFrame()
+    rows = []
     for model_name in model_names:
         print(model_name)
         if model_name and model_name[0:3] == "snf":
@@ -70,8 +70,9 @@ def main(cfg: DictConfig):
             eval_info = evaluate(cfg, path_to_model, target, num_samples)
             eval_info.update(seed=seed,
                              model_name=model_name)
-            results = results.append(eval_info, ignore_index=True)
+            rows.append(eval_info)
 
+    results = pd.DataFrame(rows)
     keys = ["eval_ess_flow", "eval_ess_ais", "test_set_mean_log_prob", 'kl_forward']
     print("\n *******  mean  ********************** \n")
     print(results.groupby("model_name").mean()[keys])
@@ -79,7 +80,7 @@ def main(cfg: DictConfig):
     print(results.groupby("model_name").sem(ddof=0)[keys])
     print("overall results")
     print(results[["model_name", "seed", "eval_ess_flow", "eval_ess_ais", "test_set_mean_log_prob"]])
-    results.to_csv(open(FILENAME_EVAL_INFO, "w"))
+    results.to_csv(FILENAME_EVAL_INFO)
 
 
 # use base config of GMM but overwrite for specific model.
@@ -90,7 +91,7 @@ def alpha_study(cfg: DictConfig):
     num_samples = int(5e4)
 
     target = setup_target(cfg, num_samples)
-    results = pd.DataFrame()
+    rows = []
     for fab_type in ["buff", "no_buff"]:
         for alpha in alpha_values:
             for seed in seeds:
@@ -101,8 +102,9 @@ def alpha_study(cfg: DictConfig):
                 eval_info = evaluate(cfg, path_to_model, target, num_samples)
                 eval_info.update(seed=seed,
                                  model_name=name_without_seed)
-                results = results.append(eval_info, ignore_index=True)
+                rows.append(eval_info)
 
+    results = pd.DataFrame(rows)
     keys = ["eval_ess_flow", "eval_ess_ais", "test_set_mean_log_prob", 'kl_forward']
     print("\n *******  mean  ********************** \n")
     print(results.groupby("model_name").mean()[keys])
@@ -110,7 +112,7 @@ def alpha_study(cfg: DictConfig):
     print(results.groupby("model_name").sem(ddof=0)[keys])
     print("overall results")
     print(results[["model_name", "seed", "eval_ess_flow", "eval_ess_ais", "test_set_mean_log_prob"]])
-    results.to_csv(open(FILENAME_EVA_ALPHA_INFO, "w"))
+    results.to_csv(FILENAME_EVA_ALPHA_INFO)
 
 
 FILENAME_EVAL_INFO = PATH + "/gmm_results.csv"
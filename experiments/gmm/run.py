@@ -10,6 +10,9 @@ import torch
 def setup_gmm_plotter(cfg: DictConfig, target: GMM, buffer=None) -> Plotter:
     plotting_bounds = (-cfg.target.loc_scaling * 1.4, cfg.target.loc_scaling * 1.4)
 
+    # No grad is safe here only because the SNF flows of gmm.yaml use metropolis layers. The
+    # normflows HMC layers take gradients when sampling, so would fail within `torch.no_grad()`.
+    @torch.no_grad()
     def plot(fab_model, n_samples: int = 800):
         if cfg.training.prioritised_buffer is True and cfg.training.use_buffer is True:
             fig, axs = plt.subplots(1, 3, figsize=(12, 4))
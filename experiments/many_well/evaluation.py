@@ -6,6 +6,7 @@ from omegaconf import DictConfig
 import torch
 
 from fab.target_distributions.many_well import ManyWellEnergy
+from fab.utils.training import default_dtype
 from experiments.load_model_for_eval import load_model
 
 
@@ -15,7 +16,9 @@ PATH = os.getcwd()
 def evaluate_many_well(cfg: DictConfig, path_to_model: str, target, num_samples=int(5e4)):
     test_set_exact = target.sample((num_samples, ))
     test_set_log_prob_over_p = torch.mean(target.log_prob(test_set_exact) - target.log_Z).cpu().item()
-    test_set_modes_log_prob_over_p = torch.mean(target.log_prob(target._test_set_modes) - target.log_Z)
+    test_set_modes_log_prob = torch.cat([target.log_prob(x) for x in
+                                         target.get_modes_test_set_iterator(batch_size=num_samples)])
+    test_set_modes_log_prob_over_p = torch.mean(test_set_modes_log_prob - target.log_Z)
     print(f"test set log prob under p: {test_set_log_prob_over_p:.2f}")
     print(f"modes test set log prob under p: {test_set_modes_log_prob_over_p:.2f}")
     model = load_model(cfg, target, path_to_model)
@@ -32,40 +35,40 @@ def main(cfg: DictConfig):
     seeds = [1, 2, 3]
     num_samples = int(5e4)  # Divided into 50 runs of 1000
 
-    results = pd.DataFrame()
-    for model_name in model_names:
-        torch.set_default_dtype(torch.float32)
-        torch.manual_seed(cfg.training.seed)
+    dtype = torch.float64 if cfg.training.use_64_bit else torch.float32
+    with default_dtype(dtype):
+        # The target is the same for every model, so only set it up once.
         target = ManyWellEnergy(cfg.target.dim, a=-0.5, b=-6, use_gpu=False)
-        if model_name and model_name[0:3] == "snf":
-            # Update flow architecture for SNF if used.
-            cfg.flow.use_snf = True
-        else:
-            cfg.flow.use_snf = False
-        if model_name and model_name[0:3] == "rbd":
-            cfg.flow.resampled_base = True
-        else:
-            cfg.flow.resampled_base = False
-        if cfg.training.use_64_bit:
-            torch.set_default_dtype(torch.float64)
-            target = target.double()
-        for seed in seeds:
-            name = model_name + f"_seed{seed}"
-            path_to_model = f"{PATH}/models/{name}.pt"
-            print(f"get results for {name}")
-            eval_info = evaluate_many_well(cfg, path_to_model, target, num_samples)
-            eval_info.update(seed=seed,
-                             model_name=model_name)
-            results = results.append(eval_info, ignore_index=True)
 
+        rows = []
+        for model_name in model_names:
+            torch.manual_seed(cfg.training.seed)
+            if model_name and model_name[0:3] == "snf":
+                # Update flow architecture for SNF if used.
+                cfg.flow.use_snf = True
+            else:
+                cfg.flow.use_snf = False
+            if model_name and model_name[0:3] == "rbd":
+                cfg.flow.resampled_base = True
+            else:
+                cfg.flow.resampled_base = False
+            for seed in seeds:
+                name = model_name + f"_seed{seed}"
+                path_to_model = f"{PATH}/models/{name}.pt"
+                print(f"get results for {name}")
+                eval_info = evaluate_many_well(cfg, path_to_model, target, num_samples)
+                eval_info.update(seed=seed,
+                                 model_name=model_name)
+                rows.append(eval_info)
 
+    results = pd.DataFrame(rows)
     keys = ["eval_ess_flow", 'test_set_exact_mean_log_prob', 'test_set_modes_mean_log_prob',
             'relative_MSE_Z_estimate', 'abs_MSE_log_Z_estimate', "forward_kl"]
     print("\n *******  mean  ********************** \n")
     print(results.groupby("model_name").mean()[keys].to_latex())
     print("\n ******* std ********************** \n")
     print((results.groupby("model_name").sem(ddof=0)[keys]).to_latex())
-    results.to_csv(open(FILENAME_EVAL_INFO, "w"))
+    results.to_csv(FILENAME_EVAL_INFO)
 
     print("overall results")
     print(results[["model_name", "seed"] + keys])
@@ -145,6 +145,28 @@ def test_ais__eval_batch(
 
 
 
+def test_ais__hmc_within_no_grad(batch_size: int = 100,
+                                 dim: int = 2,
+                                 n_ais_intermediate_distributions: int = 10,
+                                 seed: int = 0):
+    """HMC computes gradients of the base and target log prob, so AIS must give the same result
+    when called within `torch.no_grad()` (e.g. when plotting) as with grad enabled."""
+    ais, _ = setup_ais(dim=dim, n_ais_intermediate_distributions=n_ais_intermediate_distributions,
+                       seed=seed, transition_operator_type="hmc")
+    torch.manual_seed(seed)
+    points, log_w = ais.sample_and_log_weights(batch_size, logging=False)
+
+    ais, _ = setup_ais(dim=dim, n_ais_intermediate_distributions=n_ais_intermediate_distributions,
+                       seed=seed, transition_operator_type="hmc")
+    torch.manual_seed(seed)
+    with torch.no_grad():
+        points_no_grad, log_w_no_grad = ais.sample_and_log_weights(batch_size, logging=False)
+
+    assert torch.isfinite(log_w_no_grad).all()
+    assert torch.allclose(points.x, points_no_grad.x)
+    assert torch.allclose(log_w, log_w_no_grad)
+
+
 def test_ais__overall(dim: int = 2,
             n_ais_intermediate_distributions: int = 40,
             n_iterations: int = 40,
@@ -48,11 +48,13 @@ class Point:
 
 
 def grad_and_value(x, forward_fn):
-    """Calculate the forward pass of a function y = f(x) as well as its gradient w.r.t x."""
-    x = x.detach()
-    x.requires_grad = True
-    y = forward_fn(x)
-    grad = torch.autograd.grad(y, x,  grad_outputs=torch.ones_like(y), retain_graph=True)[0]
+    """Calculate the forward pass of a function y = f(x) as well as its gradient w.r.t x.
+    Grad is enabled locally so that this also works when called within `torch.no_grad()`."""
+    with torch.enable_grad():
+        x = x.detach()
+        x.requires_grad = True
+        y = forward_fn(x)
+        grad = torch.autograd.grad(y, x,  grad_outputs=torch.ones_like(y), retain_graph=True)[0]
     return grad.detach(), y.detach()
 
 
@@ -23,9 +23,11 @@ class Energy(torch.nn.Module):
         return self._energy(x) / temperature
 
     def force(self, x, temperature=None):
-        x = x.requires_grad_(True)
+        if not x.requires_grad:
+            # Use a detached copy rather than setting requires_grad on the input in place.
+            x = x.detach().requires_grad_(True)
         e = self.energy(x, temperature=temperature)
-        return -torch.autograd.grad(e.sum(), x)[0]
+        return -torch.autograd.grad(e.sum(), x, create_graph=False, retain_graph=False)[0]
 
 
 class DoubleWellEnergy(Energy, nn.Module):
@@ -42,10 +44,11 @@ class DoubleWellEnergy(Energy, nn.Module):
             self.register_buffer("scales", torch.tensor([0.5, 0.5]))
 
     def _energy_dim_1(self, x_1):
-        return self._a * x_1 + self._b * x_1.pow(2) + self._c * x_1.pow(4)
+        x_1_sq = x_1 * x_1
+        return self._a * x_1 + self._b * x_1_sq + self._c * x_1_sq * x_1_sq
 
     def _energy_dim_2(self, x_2):
-        return 0.5 * x_2.pow(2)
+        return 0.5 * x_2 * x_2
 
     def _energy(self, x):
         x_1 = x[:, 0]
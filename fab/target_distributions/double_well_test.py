@@ -0,0 +1,15 @@
+from fab.target_distributions.double_well import DoubleWellEnergy
+import torch
+
+
+def test_double_well_force():
+    target = DoubleWellEnergy(2)
+    for requires_grad in [False, True]:
+        x = torch.randn((50, 2), requires_grad=requires_grad)
+        force = target.force(x)
+        # The input should not be changed to require grad.
+        assert x.requires_grad == requires_grad
+
+        x_ = x.detach().requires_grad_(True)
+        grad_energy = torch.autograd.grad(target.energy(x_).sum(), x_)[0]
+        assert torch.allclose(force, -grad_energy)
@@ -81,8 +81,9 @@ class GMM(nn.Module, TargetDistribution):
         bias_normed = self.evaluate_expectation(samples, log_w)
         bias_no_correction = self.evaluate_expectation(samples, torch.ones_like(log_w))
         if log_q_fn:
-            log_q_test = log_q_fn(self.test_set)
-            log_p_test = self.log_prob(self.test_set)
+            test_set = self.test_set  # Sample the test set once, so log_q & log_p share points.
+            log_q_test = log_q_fn(test_set)
+            log_p_test = self.log_prob(test_set)
             test_mean_log_prob = torch.mean(log_q_test)
             kl_forward = torch.mean(log_p_test - log_q_test)
             ess_over_p = effective_sample_size_over_p(log_p_test - log_q_test)
@@ -0,0 +1,28 @@
+from fab.target_distributions.gmm import GMM
+import torch
+
+
+def test_gmm_performance_metrics_shares_test_set(dim: int = 2):
+    torch.manual_seed(0)
+    target = GMM(dim=dim, n_mixes=4, loc_scaling=5, use_gpu=False, n_test_set_samples=100,
+                 true_expectation_estimation_n_samples=1000)
+    samples = target.sample((100,))
+
+    # Record the points that log_q and log_p are evaluated on.
+    evaluated_points = {}
+    target_log_prob = target.log_prob
+
+    def log_q_fn(x):
+        evaluated_points["log_q"] = x
+        return target_log_prob(x)
+
+    def log_p_fn(x):
+        evaluated_points["log_p"] = x
+        return target_log_prob(x)
+
+    target.log_prob = log_p_fn
+    info = target.performance_metrics(samples, torch.zeros(samples.shape[0]), log_q_fn=log_q_fn)
+
+    assert torch.equal(evaluated_points["log_q"], evaluated_points["log_p"])
+    # With q = p evaluated on the same points, the forward KL is exactly 0.
+    assert info["kl_forward"] == 0.0
@@ -1,4 +1,4 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterator
 
 import numpy as np
 
@@ -12,6 +12,16 @@ from fab.wrappers.torch import WrappedTorchDist
 from fab.target_distributions.double_well import DoubleWellEnergy
 
 
+@torch.jit.script
+def _many_well_log_prob(x: torch.Tensor, a: float, b: float, c: float) -> torch.Tensor:
+    """Unnormalised log prob of the Many Well, where each double well is given by a pair of
+    neighbouring dimensions of x. Scripted so that the elementwise ops are fused."""
+    x_1 = x[..., 0::2]
+    x_2 = x[..., 1::2]
+    x_1_sq = x_1 * x_1
+    energy = a * x_1 + b * x_1_sq + c * x_1_sq * x_1_sq + 0.5 * x_2 * x_2
+    return - torch.sum(energy, dim=-1)
+
 
 class ManyWellEnergy(DoubleWellEnergy, TargetDistribution):
     """Many Well target distribution create by repeating the Double Well Boltzmann distribution."""
@@ -23,30 +33,22 @@ class ManyWellEnergy(DoubleWellEnergy, TargetDistribution):
         super(ManyWellEnergy, self).__init__(dim=2, a=a, b=b, c=c)
         self.dim = dim
         self.centre = 1.7
-        self.max_dim_for_all_modes = 40  # otherwise we get memory issues on huuuuge test set
-        if self.dim < self.max_dim_for_all_modes:
-            dim_1_vals_grid = torch.meshgrid([torch.tensor([-self.centre, self.centre])for _ in
-                                              range(self.n_wells)])
-            dim_1_vals = torch.stack([torch.flatten(dim) for dim in dim_1_vals_grid], dim=-1)
-            n_modes = 2**self.n_wells
-            assert n_modes == dim_1_vals.shape[0]
-            test_set = torch.zeros((n_modes, dim))
-            test_set[:, torch.arange(dim) % 2 == 0] = dim_1_vals
-            self.register_buffer("_test_set_modes", test_set)
+        # Test sets are generated on the fly, so keep a buffer to follow the module's dtype
+        # (e.g. after `.double()`), which the generated test sets are created with.
+        self.register_buffer("_dtype_reference", torch.zeros(()), persistent=False)
+        if use_gpu and torch.cuda.is_available():
+            self.cuda()
+            self.device = "cuda"
         else:
-            print("using test set containing not all modes to prevent memory issues")
+            self.device = "cpu"
+        # Modes are generated on the fly, so memory is not an issue, but above this dim there are
+        # too many modes (2**n_wells) to evaluate them all.
+        self.max_dim_for_all_modes = 40
+        if self.dim >= self.max_dim_for_all_modes:
+            print("using test set containing not all modes as there are too many modes")
 
         self.shallow_well_bounds = [-1.75, -1.65]
         self.deep_well_bounds = [1.7, 1.8]
-
-        if use_gpu:
-            if torch.cuda.is_available():
-                self.cuda()
-                self.device = "cuda"
-            else:
-                self.device = "cpu"
-        else:
-            self.device = "cpu"
         self.normalised = normalised
 
     @property
@@ -65,25 +67,40 @@ class ManyWellEnergy(DoubleWellEnergy, TargetDistribution):
                              for _ in range(self.n_wells)],
                             dim=-1)
 
-    def get_modes_test_set_iterator(self, batch_size: int):
+    @property
+    def dtype(self) -> torch.dtype:
+        return self._dtype_reference.dtype
+
+    def _iter_all_modes(self, batch_size: int) -> Iterator[torch.Tensor]:
+        """Iterate through all 2**n_wells modes, only creating `batch_size` of them at a time.
+        Mode k has the first dim of well j at -/+ centre depending on the j-th bit of k
+        (most significant bit first)."""
+        n_modes = 2**self.n_wells
+        shifts = torch.arange(self.n_wells - 1, -1, -1, device=self.device)
+        for start in range(0, n_modes, batch_size):
+            mode_index = torch.arange(start, min(start + batch_size, n_modes), device=self.device)
+            bits = ((mode_index[:, None] >> shifts) & 1).to(self.dtype)
+            x = torch.zeros((mode_index.shape[0], self.dim), dtype=self.dtype, device=self.device)
+            x[:, 0::2] = bits * (2 * self.centre) - self.centre
+            yield x
+
+    def get_modes_test_set_iterator(self, batch_size: int) -> Iterator[torch.Tensor]:
         """Test set created from points manually placed near each mode."""
         if self.dim < self.max_dim_for_all_modes:
-            test_set = self._test_set_modes
+            return self._iter_all_modes(batch_size)
         else:
             outer_batch_size = int(1e4)
-            test_set = torch.zeros((outer_batch_size, self.dim))
-            test_set[:, torch.arange(self.dim) % 2 == 0] = \
-                -self.centre + self.centre * 2 * \
-                torch.randint(high=2, size=(outer_batch_size, int(self.dim/2)))
-        return DatasetIterator(batch_size=batch_size, dataset=test_set,
-                               device=self.device)
+            test_set = torch.zeros((outer_batch_size, self.dim), dtype=self.dtype,
+                                   device=self.device)
+            # Randomly place the first dim of each well at -centre or +centre.
+            signs = torch.empty((outer_batch_size, self.n_wells), dtype=self.dtype,
+                                device=self.device).bernoulli_(0.5).mul_(2).sub_(1)
+            test_set[:, 0::2] = signs * self.centre
+            return DatasetIterator(batch_size=batch_size, dataset=test_set,
+                                   device=self.device)
 
     def log_prob(self, x):
-        log_prob = torch.sum(
-            torch.stack(
-                [super(ManyWellEnergy, self).log_prob(x[:, i*2:i*2+2])
-                 for i in range(self.n_wells)]),
-            dim=0)
+        log_prob = _many_well_log_prob(x, float(self._a), float(self._b), float(self._c))
         if self.normalised:
             return log_prob - self.log_Z
         else:
@@ -119,29 +136,28 @@ class ManyWellEnergy(DoubleWellEnergy, TargetDistribution):
             assert batch_size is not None
             n_batches = max(log_w.shape[0] // batch_size, 1)
 
-            sum_log_prob = 0.0
-            sum_log_prob_exact = 0.0
-            sum_kl_exact = 0.0
+            eval_batch_size = batch_size * n_batches
             test_set_iterator_modes = self.get_modes_test_set_iterator(batch_size=batch_size)
 
-            for x in test_set_iterator_modes:
-                # Mode test set.
-                log_q_x_modes = torch.sum(log_q_fn(x)).detach().cpu()
-                sum_log_prob += log_q_x_modes
-
-            for _ in range(n_batches):
-                # Samples from p test set.
-                x_exact = self.sample((batch_size,))
-                log_q_x_exact = log_q_fn(x_exact)
-                sum_log_prob_exact += torch.sum(log_q_x_exact).detach().cpu()
-                sum_kl_exact += torch.sum(self.log_prob(x_exact) - self.log_Z - log_q_x_exact).detach().cpu()
-
-            eval_batch_size = batch_size * n_batches
+            # Forward passes of log_q_fn are done in batches of `batch_size`, but their outputs are
+            # concatenated so that each metric is a single reduction, computed on the device of
+            # log_q_fn's output. They are only moved to the cpu at the end.
+            # log_q_fn is run with the caller's grad mode, as it may require grad internally
+            # (e.g. the HMC layers of an SNF), so we detach its outputs instead.
+            # Mode test set.
+            log_q_x_modes = torch.cat([log_q_fn(x).detach() for x in test_set_iterator_modes])
+
+            # Samples from p test set. Sampling from p and evaluating log p is cheap, so is done
+            # for all points at once.
+            with torch.no_grad():
+                x_exact = self.sample((eval_batch_size,))
+                log_p_x_exact = self.log_prob(x_exact) - self.log_Z
+            log_q_x_exact = torch.cat([log_q_fn(x).detach() for x in x_exact.split(batch_size)])
 
             info.update(
-                test_set_modes_mean_log_prob=(sum_log_prob / test_set_iterator_modes.test_set_n_points).cpu().item(),
-                test_set_exact_mean_log_prob=(sum_log_prob_exact / eval_batch_size).cpu().item(),
-                forward_kl=(sum_kl_exact / eval_batch_size).cpu().item(),
+                test_set_modes_mean_log_prob=torch.mean(log_q_x_modes).cpu().item(),
+                test_set_exact_mean_log_prob=torch.mean(log_q_x_exact).cpu().item(),
+                forward_kl=torch.mean(log_p_x_exact - log_q_x_exact).cpu().item(),
                 eval_batch_size=eval_batch_size
             )
         return info
@@ -153,7 +169,7 @@ if __name__ == '__main__':
     dim = 8
     target = ManyWellEnergy(dim=dim)
     samples = target.sample((1000,))
-    samples_modes = target._test_set_modes
+    samples_modes = next(target.get_modes_test_set_iterator(batch_size=1000))
 
 
     plotting_bounds = (-3, 3)
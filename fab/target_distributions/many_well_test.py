@@ -1,4 +1,7 @@
 from fab.target_distributions.many_well import ManyWellEnergy
+import numpy as np
+import normflows as nf
+import pytest
 import torch
 import matplotlib.pyplot as plt
 
@@ -30,5 +33,64 @@ def test_many_well(dim: int = 6):
     print(target.performance_metrics(samples=samples, log_w=torch.ones(samples.shape[0]),
                                log_q_fn=target.log_prob, batch_size=500))
 
+def test_many_well_log_prob_matches_double_well(dim: int = 8):
+    target = ManyWellEnergy(dim, a=-0.5, b=-6, use_gpu=False)
+    x = torch.randn((50, dim))
+    log_prob = target.log_prob(x)
+    log_prob_per_well = torch.stack([target.log_prob_2D(x[:, i*2:i*2+2])
+                                     for i in range(dim // 2)], dim=0).sum(dim=0)
+    assert log_prob.shape == (50,)
+    assert torch.allclose(log_prob, log_prob_per_well)
+
+def check_grad_matches_double_well(use_gpu: bool, dim: int = 8, n_calls: int = 5):
+    """The scripted log prob is profiled on its first calls and then replaced by an optimised
+    (fused) graph, so check the gradients over several calls against the eager per-well ones."""
+    target = ManyWellEnergy(dim, a=-0.5, b=-6, use_gpu=use_gpu)
+    for _ in range(n_calls):
+        x = torch.randn((50, dim), device=target.device, requires_grad=True)
+        grad = torch.autograd.grad(target.log_prob(x).sum(), x)[0]
+        log_prob_per_well = torch.stack([target.log_prob_2D(x[:, i*2:i*2+2])
+                                         for i in range(dim // 2)], dim=0).sum(dim=0)
+        grad_per_well = torch.autograd.grad(log_prob_per_well.sum(), x)[0]
+        assert torch.allclose(grad, grad_per_well)
+
+def test_many_well_grad_matches_double_well():
+    check_grad_matches_double_well(use_gpu=False)
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="requires CUDA")
+def test_many_well_grad_matches_double_well_cuda():
+    check_grad_matches_double_well(use_gpu=True)
+
+def test_many_well_modes_test_set(dim: int = 8):
+    target = ManyWellEnergy(dim, a=-0.5, b=-6, use_gpu=False)
+    modes = torch.cat(list(target.get_modes_test_set_iterator(batch_size=3)), dim=0)
+    assert modes.shape == (2**(dim // 2), dim)
+    assert torch.unique(modes, dim=0).shape[0] == modes.shape[0]
+    assert torch.all(torch.abs(modes[:, 0::2]) == target.centre)
+    assert torch.all(modes[:, 1::2] == 0)
+
+def test_many_well_test_sets_follow_module_dtype():
+    for dim in [8, 40]:  # all modes, and random subset of modes
+        target = ManyWellEnergy(dim, a=-0.5, b=-6, use_gpu=False)
+        assert next(target.get_modes_test_set_iterator(batch_size=10)).dtype == \
+               torch.get_default_dtype()
+        target = target.double()
+        assert next(target.get_modes_test_set_iterator(batch_size=10)).dtype == torch.float64
+        assert "_dtype_reference" not in target.state_dict()
+
+def test_many_well_performance_metrics_snf_hmc(dim: int = 4):
+    """The HMC layers of an SNF flow take gradients within their log prob, so this must work when
+    the flow's log prob is used as `log_q_fn`."""
+    target = ManyWellEnergy(dim, a=-0.5, b=-6, use_gpu=False)
+    base = nf.distributions.DiagGaussian(dim)
+    flows = [nf.flows.HamiltonianMonteCarlo(target, steps=2, log_step_size=torch.zeros(dim),
+                                            log_mass=torch.zeros(dim))]
+    flow = nf.NormalizingFlow(base, flows, p=target)
+    samples = target.sample((100,))
+    info = target.performance_metrics(samples=samples, log_w=torch.zeros(samples.shape[0]),
+                                      log_q_fn=flow.log_prob, batch_size=10)
+    assert np.isfinite(info["test_set_exact_mean_log_prob"])
+    assert np.isfinite(info["test_set_modes_mean_log_prob"])
+
 if __name__ == '__main__':
     test_many_well(32)
@@ -1,4 +1,5 @@
 import os
+from contextlib import contextmanager
 
 import yaml
 import numpy as np
@@ -33,6 +34,20 @@ def get_latest_checkpoint(dir_path, key=''):
     return checkpoints[-1]
 
 
+@contextmanager
+def default_dtype(dtype: torch.dtype):
+    """
+    Set the default torch dtype within the context, restoring the previous default on exit
+    :param dtype: Default dtype to use within the context
+    """
+    previous_dtype = torch.get_default_dtype()
+    torch.set_default_dtype(dtype)
+    try:
+        yield
+    finally:
+        torch.set_default_dtype(previous_dtype)
+
+
 class DatasetIterator:
     """Create an iterator that returns batches of data. This is useful for iterating through
     a dataset and performing multiple forward passes without overloading the GPU."""